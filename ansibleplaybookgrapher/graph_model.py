@@ -76,8 +76,10 @@ class Node:
         Set the path of this based on the raw object. Not all objects have path
         :return:
         """
-        if self.raw_object and self.raw_object.get_ds():
-            self.path, self.line, self.column = self.raw_object.get_ds().ansible_pos
+        if self.raw_object:
+            data_structure = self.raw_object.get_ds()
+            if data_structure:
+                self.path, self.line, self.column = data_structure.ansible_pos
 
     def get_first_parent_matching_type(self, node_type: type) -> type:
         """
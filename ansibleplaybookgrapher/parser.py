@@ -13,10 +13,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from abc import ABC, abstractmethod
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Tuple, FrozenSet, Optional, Set
 
 from ansible.cli import CLI
 from ansible.errors import AnsibleParserError, AnsibleUndefinedVariable, AnsibleError
+from ansible.module_utils.common.yaml import HAS_LIBYAML
 from ansible.parsing.yaml.objects import AnsibleUnicode
 from ansible.playbook import Playbook
 from ansible.playbook.block import Block
@@ -24,6 +25,7 @@ from ansible.playbook.helpers import load_list_of_blocks
 from ansible.playbook.play import Play
 from ansible.playbook.role import Role
 from ansible.playbook.role_include import IncludeRole
+from ansible.playbook.taggable import Taggable
 from ansible.playbook.task import Task
 from ansible.playbook.task_include import TaskInclude
 from ansible.template import Templar
@@ -40,14 +42,49 @@ from ansibleplaybookgrapher.graph_model import (
 from ansibleplaybookgrapher.utils import (
     clean_name,
     handle_include_path,
-    has_role_parent,
     generate_id,
     convert_when_to_str,
     hash_value,
+    is_possibly_template,
+    clear_include_cache,
 )
 
 display = Display()
 
+# The prefix of the generated ids of the tasks depending on their type
+_TASK_ID_PREFIXES = {
+    "pre_task": "pre_task_",
+    "task": "task_",
+    "post_task": "post_task_",
+}
+
+# The composition of the parent node where the tasks are added depending on their type
+_TASK_COMPOSITIONS = {
+    "pre_task": "pre_tasks",
+    "task": "tasks",
+    "post_task": "post_tasks",
+}
+
+# Marker pushed on the stack of the blocks to process to remove the last parent node once its children are processed
+_POP_PARENT = object()
+
+
+def _restore_implicit(block: Block, original_block: Block):
+    """
+    Block.copy doesn't keep whether the blocks are implicit. Set it back on a copied block and on all its nested blocks
+    (from static imports or explicit blocks) from the original ones.
+    :param block: The copied block
+    :param original_block: The block that has been copied
+    :return:
+    """
+    block._implicit = original_block._implicit
+    for attribute in ("block", "rescue", "always"):
+        for task, original_task in zip(
+            getattr(block, attribute) or [], getattr(original_block, attribute) or []
+        ):
+            if isinstance(task, Block):
+                _restore_implicit(task, original_task)
+
 
 class BaseParser(ABC):
     """
@@ -60,13 +97,35 @@ class BaseParser(ABC):
         :param tags: Only add plays and tasks tagged with these values
         :param skip_tags: Only add plays and tasks whose tags do not match these values
         """
+        if not HAS_LIBYAML:
+            display.warning(
+                "PyYAML is installed without libyaml: parsing the playbooks will be much slower. "
+                "Install libyaml (libyaml-dev or libyaml-devel) and reinstall PyYAML to use it."
+            )
+
         loader, inventory, variable_manager = CLI._play_prereqs()
         self.data_loader = loader
         self.inventory_manager = inventory
         self.variable_manager = variable_manager
 
-        self.tags = tags or ["all"]
-        self.skip_tags = skip_tags or []
+        # Ansible only checks the membership of the tags: like Ansible's PlayContext, they are kept in sets
+        self.tags: FrozenSet[str] = frozenset(tags or ["all"])
+        self.skip_tags: FrozenSet[str] = frozenset(skip_tags or [])
+
+        # Whether the untagged tasks, blocks or roles are included. This is the result of Ansible's evaluate_tags for
+        # objects without tags: it only depends on the tags and skip_tags, so it is computed once.
+        # See :func:`~ansible.playbook.taggable.Taggable.evaluate_tags`
+        self._untagged_included = (
+            "all" in self.tags or "untagged" in self.tags
+        ) and not ("all" in self.skip_tags or "untagged" in self.skip_tags)
+
+        # The ids of the variables shared by several tasks, like the play vars. Only what is computed from them is
+        # cached: the other variables are built for a single include and would never be seen again.
+        self._shared_vars_ids: Set[int] = set()
+
+        # Templars cached by the identity of their variables. The variables are kept alongside the templar so that
+        # their id can't be reused while the entry is in the cache.
+        self._templar_cache: Dict[int, Tuple[Dict, Templar]] = {}
 
     @abstractmethod
     def parse(self, *args, **kwargs) -> PlaybookNode:
@@ -82,8 +141,12 @@ class BaseParser(ABC):
         :param variables:
         :return:
         """
+        if isinstance(data, str) and not is_possibly_template(data):
+            # Nothing to template: most of the names are plain strings
+            return data
+
         try:
-            templar = Templar(loader=self.data_loader, variables=variables)
+            templar = self._get_templar(variables)
             return templar.template(data, fail_on_undefined=fail_on_undefined)
         except AnsibleError as ansible_error:
             # Sometimes we need to export
@@ -92,6 +155,38 @@ class BaseParser(ABC):
             display.warning(ansible_error)
             return data
 
+    def _evaluate_tags(self, obj: Taggable, all_vars: Dict) -> bool:
+        """
+        Check if the task, block or role should be included in the graph depending on the tags
+        :param obj: The object to check
+        :param all_vars: The variables used to template the tags of the object
+        :return: True if the object should be included, false otherwise
+        """
+        if not obj.tags:
+            return self._untagged_included
+
+        return obj.evaluate_tags(
+            only_tags=self.tags, skip_tags=self.skip_tags, all_vars=all_vars
+        )
+
+    def _get_templar(self, variables: Dict) -> Templar:
+        """
+        Return a Templar for the given variables. For the shared variables, it is created only the first time they are
+        seen.
+        :param variables:
+        :return:
+        """
+        key = id(variables)
+        if key not in self._shared_vars_ids:
+            return Templar(loader=self.data_loader, variables=variables)
+
+        cached = self._templar_cache.get(key)
+        if cached is None:
+            cached = (variables, Templar(loader=self.data_loader, variables=variables))
+            self._templar_cache[key] = cached
+
+        return cached[1]
+
     def _add_task(
         self, task: Task, task_vars: Dict, node_type: str, parent_node: CompositeNode
     ) -> bool:
@@ -104,20 +199,22 @@ class BaseParser(ABC):
         if task.action == "meta" and task.implicit:
             return False
 
-        if not task.evaluate_tags(
-            only_tags=self.tags, skip_tags=self.skip_tags, all_vars=task_vars
-        ):
-            display.vv(f"The task '{task.get_name()}' is skipped due to the tags.")
+        # The messages are only built when they are displayed: this is called for every task
+        task_name = task.get_name()
+        if not self._evaluate_tags(task, task_vars):
+            if display.verbosity >= 2:
+                display.vv(f"The task '{task_name}' is skipped due to the tags.")
             return False
 
-        display.vv(f"Adding {node_type} '{task.get_name()}' to the graph")
+        if display.verbosity >= 2:
+            display.vv(f"Adding {node_type} '{task_name}' to the graph")
 
-        task_name = clean_name(self.template(task.get_name(), task_vars))
+        task_name = clean_name(self.template(task_name, task_vars))
         parent_node.add_node(
-            target_composition=f"{node_type}s",
+            target_composition=_TASK_COMPOSITIONS[node_type],
             node=TaskNode(
                 task_name,
-                generate_id(f"{node_type}_"),
+                generate_id(_TASK_ID_PREFIXES[node_type]),
                 when=convert_when_to_str(task.when),
                 raw_object=task,
                 parent=parent_node,
@@ -153,6 +250,132 @@ class PlaybookParser(BaseParser):
         self.include_role_tasks = include_role_tasks
         self.playbook_filename = playbook_filename
 
+        # The blocks loaded from the included task files. See _load_included_blocks
+        self._include_blocks_cache: Dict[
+            Tuple[str, int, int, int], Tuple[Dict, List[Block]]
+        ] = {}
+
+        # The names of the hosts by templated host pattern
+        self._hosts_pattern_cache: Dict[
+            Union[str, Tuple[str, ...]], Tuple[str, ...]
+        ] = {}
+
+        # The variables of each play, by play id. Computing them is expensive and they are needed for each include.
+        self._play_vars_cache: Dict[int, Dict] = {}
+
+    def _load_included_blocks(
+        self,
+        play: Play,
+        include_task: TaskInclude,
+        included_file_path: str,
+        task_vars: Dict,
+    ) -> Optional[List[Block]]:
+        """
+        Load the blocks of a file included with include_tasks.
+        The same file is often included multiple times in a play. The blocks are loaded once per file, play, role and
+        variables: the next includes get a copy of them attached to their own include task. Only the blocks loaded with
+        shared variables are cached: an include with its own variables can't share its blocks.
+        :param play: The play of the include task
+        :param include_task: The include task
+        :param included_file_path: The path to the included file
+        :param task_vars: The variables of the include task
+        :return: The list of blocks or None if the file is empty
+        """
+        key = (included_file_path, id(include_task._role), id(play), id(task_vars))
+        cached = self._include_blocks_cache.get(key)
+        if cached is not None:
+            block_list = []
+            for cached_block in cached[1]:
+                block = cached_block.copy(exclude_parent=True)
+                _restore_implicit(block, cached_block)
+                block._parent = include_task
+                block_list.append(block)
+            return block_list
+
+        data = self.data_loader.load_from_file(included_file_path)
+        if data is None:
+            return None
+        elif not isinstance(data, list):
+            raise AnsibleParserError(
+                "Included task files must contain a list of tasks", obj=data
+            )
+
+        block_list = load_list_of_blocks(
+            data,
+            play=play,
+            variable_manager=self.variable_manager,
+            role=include_task._role,
+            loader=self.data_loader,
+            parent_block=include_task,
+        )
+        if id(task_vars) in self._shared_vars_ids:
+            # The variables are kept in the cache so that their id can't be reused while the entry is in the cache
+            self._include_blocks_cache[key] = (task_vars, block_list)
+
+        return block_list
+
+    def _get_role_node_id(self, role_name: str) -> str:
+        """
+        Return the id to use for the node of the given role
+        :param role_name:
+        :return:
+        """
+        if not self.group_roles_by_name:
+            # A random id is used
+            return generate_id("role_")
+
+        # If we are grouping roles, we use the hash of role name as the node id. hash_value caches the hashes of the
+        # names: the roles are usually used multiple times.
+        return "role_" + hash_value(role_name)
+
+    def _get_play_hosts(self, play: Play, play_vars: Dict) -> List[str]:
+        """
+        Return the names of the hosts targeted by the play. The plays often use the same host patterns, so the names are
+        cached by templated pattern.
+        :param play:
+        :param play_vars:
+        :return:
+        """
+        pattern = self.template(play.hosts, play_vars)
+        key = tuple(pattern) if isinstance(pattern, list) else pattern
+        host_names = self._hosts_pattern_cache.get(key)
+        if host_names is None:
+            host_names = tuple(
+                h.name for h in self.inventory_manager.get_hosts(pattern)
+            )
+            self._hosts_pattern_cache[key] = host_names
+
+        return list(host_names)
+
+    def _get_play_vars(self, play: Play) -> Dict:
+        """
+        Return the variables of the play, computing them only once per play
+        :param play:
+        :return:
+        """
+        key = id(play)
+        play_vars = self._play_vars_cache.get(key)
+        if play_vars is None:
+            play_vars = self.variable_manager.get_vars(play=play)
+            self._play_vars_cache[key] = play_vars
+            self._shared_vars_ids.add(id(play_vars))
+
+        return play_vars
+
+    def _get_task_vars(self, play: Play, task: TaskInclude) -> Dict:
+        """
+        Return the variables for the given include task. Without a host, the task only adds its own vars (including
+        the ones of its parents), the include params and the role vars to the play vars. When it has none of them, the
+        play vars are returned as is.
+        :param play:
+        :param task:
+        :return:
+        """
+        if task._role is None and not task.get_vars() and not task.get_include_params():
+            return self._get_play_vars(play)
+
+        return self.variable_manager.get_vars(play=play, task=task)
+
     def parse(self, *args, **kwargs) -> PlaybookNode:
         """
         Loop through the playbook and generate the graph.
@@ -175,123 +398,134 @@ class PlaybookParser(BaseParser):
         )
         # the root node
         playbook_root_node = PlaybookNode(self.playbook_filename, raw_object=playbook)
-        # loop through the plays
-        for play in playbook.get_plays():
-            # the load basedir is relative to the playbook path
-            if play._included_path is not None:
-                self.data_loader.set_basedir(play._included_path)
-            else:
-                self.data_loader.set_basedir(playbook._basedir)
-            display.vvv(f"Loader basedir set to {self.data_loader.get_basedir()}")
-
-            play_vars = self.variable_manager.get_vars(play)
-            play_hosts = [
-                h.get_name()
-                for h in self.inventory_manager.get_hosts(
-                    self.template(play.hosts, play_vars)
-                )
-            ]
-            play_name = f"Play: {clean_name(play.get_name())} ({len(play_hosts)})"
-            play_name = self.template(play_name, play_vars)
+        try:
+            # loop through the plays
+            for play in playbook.get_plays():
+                self._parse_play(playbook, play, playbook_root_node)
+        finally:
+            # Do not hold the variables of this run once the parsing is done, even if it failed
+            self._templar_cache.clear()
+            self._play_vars_cache.clear()
+            self._shared_vars_ids.clear()
+            self._include_blocks_cache.clear()
+            clear_include_cache()
 
-            display.v(f"Parsing {play_name}")
+        return playbook_root_node
 
-            play_node = PlayNode(
-                play_name, hosts=play_hosts, raw_object=play, parent=playbook_root_node
+    def _parse_play(
+        self, playbook: Playbook, play: Play, playbook_root_node: PlaybookNode
+    ) -> PlayNode:
+        """
+        Parse a play and add it to the graph.
+        The plays are parsed one after the other: they share the data loader whose basedir is set for each play.
+        :param playbook: The playbook containing the play
+        :param play: The play to parse
+        :param playbook_root_node: The node of the playbook
+        :return: The node of the play
+        """
+        # the load basedir is relative to the playbook path
+        if play._included_path is not None:
+            self.data_loader.set_basedir(play._included_path)
+        else:
+            self.data_loader.set_basedir(playbook._basedir)
+        display.vvv(f"Loader basedir set to {self.data_loader.get_basedir()}")
+
+        play_vars = self._get_play_vars(play)
+        play_hosts = self._get_play_hosts(play, play_vars)
+        play_name = f"Play: {clean_name(play.get_name())} ({len(play_hosts)})"
+        play_name = self.template(play_name, play_vars)
+
+        display.v(f"Parsing {play_name}")
+
+        play_node = PlayNode(
+            play_name, hosts=play_hosts, raw_object=play, parent=playbook_root_node
+        )
+        playbook_root_node.add_node("plays", play_node)
+
+        # loop through the pre_tasks
+        display.v("Parsing pre_tasks...")
+        for pre_task_block in play.pre_tasks:
+            self._include_tasks_in_blocks(
+                current_play=play,
+                parent_nodes=[play_node],
+                block=pre_task_block,
+                play_vars=play_vars,
+                node_type="pre_task",
             )
-            playbook_root_node.add_node("plays", play_node)
-
-            # loop through the pre_tasks
-            display.v("Parsing pre_tasks...")
-            for pre_task_block in play.pre_tasks:
-                self._include_tasks_in_blocks(
-                    current_play=play,
-                    parent_nodes=[play_node],
-                    block=pre_task_block,
-                    play_vars=play_vars,
-                    node_type="pre_task",
-                )
 
-            # loop through the roles
-            display.v("Parsing roles...")
+        # loop through the roles
+        display.v("Parsing roles...")
 
-            for role in play.get_roles():  # type: Role
-                # Don't insert tasks from ``import/include_role``, preventing duplicate graphing
-                if role.from_include:
-                    continue
+        for role in play.get_roles():  # type: Role
+            # Don't insert tasks from ``import/include_role``, preventing duplicate graphing
+            if role.from_include:
+                continue
 
-                # the role object doesn't inherit the tags from the play. So we add it manually.
-                role.tags = role.tags + play.tags
+            # the role object doesn't inherit the tags from the play. So we add it manually.
+            role.tags = role.tags + play.tags
 
-                # More context on this line, see here: https://github.com/ansible/ansible/issues/82310
-                # This seems to work for now.
-                role._parent = None
+            # More context on this line, see here: https://github.com/ansible/ansible/issues/82310
+            # This seems to work for now.
+            role._parent = None
 
-                if not role.evaluate_tags(
-                    only_tags=self.tags, skip_tags=self.skip_tags, all_vars=play_vars
-                ):
+            if not self._evaluate_tags(role, play_vars):
+                if display.verbosity >= 2:
                     display.vv(
                         f"The role '{role.get_name()}' is skipped due to the tags."
                     )
-                    # Go to the next role
-                    continue
+                # Go to the next role
+                continue
+
+            role_node = RoleNode(
+                clean_name(role.get_name()),
+                node_id=self._get_role_node_id(role.get_name()),
+                raw_object=role,
+                parent=play_node,
+            )
+            # edge from play to role
+            play_node.add_node("roles", role_node)
 
-                if self.group_roles_by_name:
-                    # If we are grouping roles, we use the hash of role name as the node id
-                    role_node_id = "role_" + hash_value(role.get_name())
-                else:
-                    # Otherwise, a random id is used
-                    role_node_id = generate_id("role_")
-                role_node = RoleNode(
-                    clean_name(role.get_name()),
-                    node_id=role_node_id,
-                    raw_object=role,
-                    parent=play_node,
-                )
-                # edge from play to role
-                play_node.add_node("roles", role_node)
-
-                if self.include_role_tasks:
-                    # loop through the tasks of the roles
-                    for block in role.compile(play):
-                        self._include_tasks_in_blocks(
-                            current_play=play,
-                            parent_nodes=[role_node],
-                            block=block,
-                            play_vars=play_vars,
-                            node_type="task",
-                        )
-                    # end of roles loop
-
-            # loop through the tasks
-            display.v("Parsing tasks...")
-            for task_block in play.tasks:
-                self._include_tasks_in_blocks(
-                    current_play=play,
-                    parent_nodes=[play_node],
-                    block=task_block,
-                    play_vars=play_vars,
-                    node_type="task",
-                )
+            if self.include_role_tasks:
+                # loop through the tasks of the roles
+                for block in role.compile(play):
+                    self._include_tasks_in_blocks(
+                        current_play=play,
+                        parent_nodes=[role_node],
+                        block=block,
+                        play_vars=play_vars,
+                        node_type="task",
+                    )
+                # end of roles loop
 
-            # loop through the post_tasks
-            display.v("Parsing post_tasks...")
-            for post_task_block in play.post_tasks:
-                self._include_tasks_in_blocks(
-                    current_play=play,
-                    parent_nodes=[play_node],
-                    block=post_task_block,
-                    play_vars=play_vars,
-                    node_type="post_task",
-                )
-            # Summary
+        # loop through the tasks
+        display.v("Parsing tasks...")
+        for task_block in play.tasks:
+            self._include_tasks_in_blocks(
+                current_play=play,
+                parent_nodes=[play_node],
+                block=task_block,
+                play_vars=play_vars,
+                node_type="task",
+            )
+
+        # loop through the post_tasks
+        display.v("Parsing post_tasks...")
+        for post_task_block in play.post_tasks:
+            self._include_tasks_in_blocks(
+                current_play=play,
+                parent_nodes=[play_node],
+                block=post_task_block,
+                play_vars=play_vars,
+                node_type="post_task",
+            )
+        # Summary
+        if display.verbosity >= 1:
             display.v(f"{len(play_node.pre_tasks)} pre_task(s) added to the graph.")
             display.v(f"{len(play_node.roles)} role(s) added to the play")
             display.v(f"{len(play_node.tasks)} task(s) added to the play")
             display.v(f"{len(play_node.post_tasks)} post_task(s) added to the play")
-            # moving to the next play
 
-        return playbook_root_node
+        return play_node
 
     def _include_tasks_in_blocks(
         self,
@@ -302,7 +536,9 @@ class PlaybookParser(BaseParser):
         play_vars: Dict,
     ):
         """
-        Recursively read all the tasks of the block and add it to the graph
+        Read all the tasks of the block and add them to the graph.
+        The blocks are walked with an explicit stack instead of recursion. The children of a block or an include are
+        pushed in reverse order so that they are popped in their original order.
         :param parent_nodes: This a list of parent nodes. Each time, we see an include_role, the corresponding node is
         added to this list
         :param current_play:
@@ -311,102 +547,116 @@ class PlaybookParser(BaseParser):
         :param node_type:
         :return:
         """
+        # Each item of the stack is a task or a block with the variables to use for it and whether one of its parents
+        # is a role. The stack follows the parent chain of the tasks so there is no need to walk it up for each task.
+        stack: List[Tuple[Union[Block, Task, object], Dict, bool]] = [
+            (block, play_vars, False)
+        ]
+
+        # Bind the attributes used for every task to local variables: this loop runs for all the tasks of the play
+        data_loader = self.data_loader
+        variable_manager = self.variable_manager
+        include_role_tasks = self.include_role_tasks
+        add_task = self._add_task
+        get_task_vars = self._get_task_vars
+        evaluate_tags = self._evaluate_tags
+
+        while stack:
+            task_or_block, play_vars, under_role = stack.pop()
+
+            if task_or_block is _POP_PARENT:
+                # We are done with the tasks of a block or of an included role: remove its node from the parents
+                parent_nodes.pop()
+                continue
 
-        if not block._implicit and block._role is None:
-            # Here we have an explicit block. Ansible internally converts all normal tasks to Block
-            block_node = BlockNode(
-                str(block.name),
-                when=convert_when_to_str(block.when),
-                raw_object=block,
-                parent=parent_nodes[-1],
-            )
-            parent_nodes[-1].add_node(f"{node_type}s", block_node)
-            parent_nodes.append(block_node)
-
-        # loop through the tasks
-        for task_or_block in block.block:
             if hasattr(task_or_block, "loop") and task_or_block.loop:
                 display.warning(
                     "Looping on tasks or roles are not supported for the moment. Only the task having the loop argument will be added to the graph."
                 )
 
             if isinstance(task_or_block, Block):
-                self._include_tasks_in_blocks(
-                    current_play=current_play,
-                    parent_nodes=parent_nodes,
-                    block=task_or_block,
-                    node_type=node_type,
-                    play_vars=play_vars,
+                if not task_or_block._implicit and task_or_block._role is None:
+                    # Here we have an explicit block. Ansible internally converts all normal tasks to Block
+                    block_node = BlockNode(
+                        str(task_or_block.name),
+                        when=convert_when_to_str(task_or_block.when),
+                        raw_object=task_or_block,
+                        parent=parent_nodes[-1],
+                    )
+                    parent_nodes[-1].add_node(_TASK_COMPOSITIONS[node_type], block_node)
+                    # The block node is the parent of its tasks. It is removed once all of them have been processed.
+                    parent_nodes.append(block_node)
+                    stack.append((_POP_PARENT, play_vars, under_role))
+
+                # loop through the tasks
+                children_under_role = under_role or task_or_block._role is not None
+                stack.extend(
+                    (t, play_vars, children_under_role)
+                    for t in reversed(task_or_block.block)
                 )
             elif isinstance(
                 task_or_block, TaskInclude
             ):  # include, include_tasks, include_role are dynamic
                 # So we need to process them explicitly because Ansible does it during the execution of the playbook
 
-                task_vars = self.variable_manager.get_vars(
-                    play=current_play, task=task_or_block
-                )
+                task_vars = get_task_vars(current_play, task_or_block)
 
                 if isinstance(task_or_block, IncludeRole):
                     # Here we have an 'include_role'. The class IncludeRole is a subclass of TaskInclude.
                     # We do this because the management of an 'include_role' is different.
                     # See :func:`~ansible.playbook.included_file.IncludedFile.process_include_results` from line 155
-                    display.v(f"An 'include_role' found: '{task_or_block.get_name()}'")
-
-                    if not task_or_block.evaluate_tags(
-                        only_tags=self.tags,
-                        skip_tags=self.skip_tags,
-                        all_vars=task_vars,
-                    ):
-                        display.vv(
-                            f"The include_role '{task_or_block.get_name()}' is skipped due to the tags."
+                    if display.verbosity >= 1:
+                        display.v(
+                            f"An 'include_role' found: '{task_or_block.get_name()}'"
                         )
+
+                    if not evaluate_tags(task_or_block, task_vars):
+                        if display.verbosity >= 2:
+                            display.vv(
+                                f"The include_role '{task_or_block.get_name()}' is skipped due to the tags."
+                            )
                         continue  # Go to the next task
 
                     # Here we are using the role name instead of the task name to keep the same behavior  as a
                     #  traditional role
-                    if self.group_roles_by_name:
-                        # If we are grouping roles, we use the hash of role name as the node id
-                        role_node_id = "role_" + hash_value(task_or_block._role_name)
-                    else:
-                        # Otherwise, a random id is used
-                        role_node_id = generate_id("role_")
                     role_node = RoleNode(
                         task_or_block._role_name,
-                        node_id=role_node_id,
+                        node_id=self._get_role_node_id(task_or_block._role_name),
                         when=convert_when_to_str(task_or_block.when),
                         raw_object=task_or_block,
                         parent=parent_nodes[-1],
                         include_role=True,
                     )
                     parent_nodes[-1].add_node(
-                        f"{node_type}s",
+                        _TASK_COMPOSITIONS[node_type],
                         role_node,
                     )
 
                     if task_or_block.loop:  # Looping on include_role is not supported
                         continue  # Go the next task
                     else:
-                        if self.include_role_tasks:
+                        if include_role_tasks:
                             # If we have an include_role, and we want to include its tasks, the parent node now becomes
-                            # the role.
+                            # the role. It is removed once all the tasks of the role have been processed.
                             parent_nodes.append(role_node)
+                            stack.append((_POP_PARENT, task_vars, under_role))
 
                         block_list, _ = task_or_block.get_block_list(
                             play=current_play,
-                            loader=self.data_loader,
-                            variable_manager=self.variable_manager,
+                            loader=data_loader,
+                            variable_manager=variable_manager,
                         )
                 else:
-                    display.v(
-                        f"An 'include_tasks' found. Including tasks from '{task_or_block.get_name()}'"
-                    )
+                    if display.verbosity >= 1:
+                        display.v(
+                            f"An 'include_tasks' found. Including tasks from '{task_or_block.get_name()}'"
+                        )
 
-                    templar = Templar(loader=self.data_loader, variables=task_vars)
+                    templar = self._get_templar(task_vars)
                     try:
                         included_file_path = handle_include_path(
                             original_task=task_or_block,
-                            loader=self.data_loader,
+                            loader=data_loader,
                             templar=templar,
                         )
                     except AnsibleUndefinedVariable as e:
@@ -415,7 +665,7 @@ class PlaybookParser(BaseParser):
                             f"Unable to translate the include task '{task_or_block.get_name()}' due to an undefined variable: {str(e)}. "
                             "Some variables are available only during the execution of the playbook."
                         )
-                        self._add_task(
+                        add_task(
                             task=task_or_block,
                             task_vars=task_vars,
                             node_type=node_type,
@@ -423,72 +673,34 @@ class PlaybookParser(BaseParser):
                         )
                         continue
 
-                    data = self.data_loader.load_from_file(included_file_path)
-                    if data is None:
+                    # get the blocks from the include_tasks
+                    block_list = self._load_included_blocks(
+                        current_play, task_or_block, included_file_path, task_vars
+                    )
+                    if block_list is None:
                         display.warning(
                             f"The file '{included_file_path}' is empty and has no tasks to include"
                         )
                         continue
-                    elif not isinstance(data, list):
-                        raise AnsibleParserError(
-                            "Included task files must contain a list of tasks", obj=data
-                        )
 
-                    # get the blocks from the include_tasks
-                    block_list = load_list_of_blocks(
-                        data,
-                        play=current_play,
-                        variable_manager=self.variable_manager,
-                        role=task_or_block._role,
-                        loader=self.data_loader,
-                        parent_block=task_or_block,
-                    )
-
-                for (
-                    b
-                ) in (
-                    block_list
-                ):  # loop through the blocks inside the included tasks or role
-                    self._include_tasks_in_blocks(
-                        current_play=current_play,
-                        parent_nodes=parent_nodes,
-                        block=b,
-                        play_vars=task_vars,
-                        node_type=node_type,
-                    )
-                if (
-                    self.include_role_tasks
-                    and isinstance(task_or_block, IncludeRole)
-                    and len(parent_nodes) > 1
-                ):
-                    # We remove the parent node we have added if we included some tasks from a role
-                    parent_nodes.pop()
+                # the blocks inside the included tasks or role
+                children_under_role = under_role or task_or_block._role is not None
+                stack.extend(
+                    (b, task_vars, children_under_role) for b in reversed(block_list)
+                )
             else:  # It's here that we add the task in the graph
-                if (
-                    len(parent_nodes) > 1  # 1
-                    and not has_role_parent(task_or_block)  # 2
-                    and parent_nodes[-1].raw_object != task_or_block._parent  # 3
-                ):
-                    # We remove a parent node :
-                    # 1. When have at least two parents. Every node (except the playbook) should have a parent node
-                    #   AND
-                    # 2. The current node doesn't have a role as parent
-                    #   AND
-                    # 3. The last parent node is different from the current node parent. This means that we are
-                    #   done with the child nodes of this parent node
-                    parent_nodes.pop()
-
                 # check if this task comes from a role, and we don't want to include tasks of the role
-                if has_role_parent(task_or_block) and not self.include_role_tasks:
+                if under_role and not include_role_tasks:
                     # skip role's task
-                    display.vv(
-                        f"The task '{task_or_block.get_name()}' has a role as parent and include_role_tasks is false. "
-                        "It will be skipped."
-                    )
+                    if display.verbosity >= 2:
+                        display.vv(
+                            f"The task '{task_or_block.get_name()}' has a role as parent and include_role_tasks is false. "
+                            "It will be skipped."
+                        )
                     # skipping
                     continue
 
-                self._add_task(
+                add_task(
                     task=task_or_block,
                     task_vars=play_vars,
                     node_type=node_type,
@@ -12,13 +12,12 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import colorsys
 import hashlib
 import os
-import uuid
 from collections import defaultdict
-from itertools import chain
-from operator import methodcaller
-from typing import Tuple, List, Dict, Any, Set
+from functools import lru_cache
+from typing import Tuple, List, Dict, Any, Set, Optional
 
 from ansible.errors import AnsibleError
 from ansible.module_utils.common.text.converters import to_text
@@ -26,12 +25,17 @@ from ansible.parsing.dataloader import DataLoader
 from ansible.playbook.role_include import IncludeRole
 from ansible.playbook.task import Task
 from ansible.playbook.task_include import TaskInclude
-from ansible.template import Templar
+from ansible.template import Templar, JINJA2_OVERRIDE
 from ansible.utils.display import Display
-from colour import Color
 
 display = Display()
 
+# The paths of the included files already resolved by handle_include_path. See clear_include_cache
+_INCLUDE_RESOLVE_CACHE: Dict[Tuple[str, Optional[str], str, str], Tuple[str, bool]] = {}
+
+# The translation table used to escape the double quotes in the names
+_CLEAN_NAME_TABLE = str.maketrans({'"': "&#34;"})
+
 
 def convert_when_to_str(when: List) -> str:
     """
@@ -42,14 +46,32 @@ def convert_when_to_str(when: List) -> str:
     if len(when) == 0:
         return ""
 
-    # Convert each element in the list to str
-    when_to_str = list(map(str, when))
-    return f"[when: {' and '.join(when_to_str)}]".strip().replace("\n", "")
+    if len(when) == 1:
+        when_to_str = str(when[0])
+    else:
+        # Convert each element in the list to str
+        when_to_str = " and ".join(map(str, when))
+
+    return f"[when: {when_to_str}]".replace("\n", "")
+
+
+def is_possibly_template(data: str) -> bool:
+    """
+    Check if a string may be a Jinja template, by looking for the default Jinja start delimiters.
+    The strings starting with a '#jinja2:' header can override the delimiters, so they are always considered as
+    templates. See :func:`~ansible.template.is_possibly_template`
+    :param data:
+    :return:
+    """
+    return (
+        "{{" in data or "{%" in data or "{#" in data or data.startswith(JINJA2_OVERRIDE)
+    )
 
 
+@lru_cache(maxsize=4096)
 def hash_value(value: str) -> str:
     """
-    Convert name to md5 to avoid issues with special chars,
+    Convert name to a short BLAKE2b hash to avoid issues with special chars,
     The ID are not visible to end user in web/rendered graph so we do
     not have to care to make them look pretty.
     There are chances for hash collisions, but we do not care for that
@@ -57,18 +79,15 @@ def hash_value(value: str) -> str:
     :param value: string which represents id
     :return: string representing a hex hash
     """
-
-    m = hashlib.md5()
-    m.update(value.encode("utf-8"))
-    return m.hexdigest()[:8]
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=4).hexdigest()
 
 
 def generate_id(prefix: str = "") -> str:
     """
-    Generate an uuid to be used as id
+    Generate a random id made of 8 hex chars, like the first part of an uuid4
     :param prefix: Prefix to add to the generated ID
     """
-    return prefix + str(uuid.uuid4())[:8]
+    return prefix + os.urandom(4).hex()
 
 
 def clean_name(name: str):
@@ -81,7 +100,7 @@ def clean_name(name: str):
     :param name: pretty name of the object
     :return: string with double quotes converted to html special char
     """
-    return name.strip().replace('"', "&#34;")
+    return name.strip().translate(_CLEAN_NAME_TABLE)
 
 
 def get_play_colors(play_id: str) -> Tuple[str, str]:
@@ -90,10 +109,16 @@ def get_play_colors(play_id: str) -> Tuple[str, str]:
     :param play_id
     :return: The main color and the font color
     """
-    picked_color = Color(pick_for=play_id, luminance=0.4)
+    # The hue is picked from the hash of the play id. The lightness is low enough to have a readable white font.
+    digest = hashlib.blake2b(play_id.encode("utf-8"), digest_size=4).digest()
+    hue = int.from_bytes(digest, "little") / 2**32
+    red, green, blue = colorsys.hls_to_rgb(hue, 0.4, 0.5)
+    picked_color = (
+        f"#{round(red * 255):02x}{round(green * 255):02x}{round(blue * 255):02x}"
+    )
     play_font_color = "#ffffff"
 
-    return picked_color.get_hex_l(), play_font_color
+    return picked_color, play_font_color
 
 
 def has_role_parent(task_block: Task) -> bool:
@@ -103,8 +128,8 @@ def has_role_parent(task_block: Task) -> bool:
     :return:
     """
     parent = task_block._parent
-    while parent:
-        if parent._role:
+    while parent is not None:
+        if parent._role is not None:
             return True
         parent = parent._parent
 
@@ -118,11 +143,14 @@ def merge_dicts(dict_1: Dict[Any, Set], dict_2: Dict[Any, Set]) -> Dict[Any, Set
     :param dict_2:
     :return:
     """
-    final = defaultdict(set)
-    # iterate dict items
-    all_dict_items = map(methodcaller("items"), [dict_1, dict_2])
-    for k, v in chain.from_iterable(all_dict_items):
-        final[k].update(v)
+    # Still a defaultdict: the renderers look up the usages of roles that may not be in there
+    final = defaultdict(set, {k: set(v) for k, v in dict_1.items()})
+    for k, v in dict_2.items():
+        values = final.get(k)
+        if values is None:
+            final[k] = set(v)
+        else:
+            values.update(v)
 
     return final
 
@@ -148,6 +176,10 @@ def handle_include_path(
         "_raw_params", original_task.args.get("name", None)
     )
 
+    # The file to include and the role don't change while walking up the parents
+    include_target = templar.template(include_param)
+    role_path = original_task._role._role_path if original_task._role else None
+
     cumulative_path = None
     while parent_include is not None:
         if not isinstance(parent_include, TaskInclude):
@@ -156,10 +188,11 @@ def handle_include_path(
         if isinstance(parent_include, IncludeRole):
             parent_include_dir = parent_include._role_path
         else:
+            parent_include_path = parent_include.args.get("_raw_params")
             try:
-                parent_include_dir = os.path.dirname(
-                    templar.template(parent_include.args.get("_raw_params"))
-                )
+                if is_possibly_template(parent_include_path):
+                    parent_include_path = templar.template(parent_include_path)
+                parent_include_dir = os.path.dirname(parent_include_path)
             except AnsibleError as e:
                 parent_include_dir = ""
                 display.warning(
@@ -172,42 +205,73 @@ def handle_include_path(
             cumulative_path = os.path.join(parent_include_dir, cumulative_path)
         else:
             cumulative_path = parent_include_dir
-        include_target = templar.template(include_param)
-        if original_task._role:
-            new_basedir = os.path.join(
-                original_task._role._role_path, "tasks", cumulative_path
-            )
-            candidates = [
-                loader.path_dwim_relative(
-                    original_task._role._role_path, "tasks", include_target
-                ),
-                loader.path_dwim_relative(new_basedir, "tasks", include_target),
-            ]
-            for include_file in candidates:
-                try:
-                    # may throw OSError
-                    os.stat(include_file)
-                    # or select the task file if it exists
-                    break
-                except OSError:
-                    pass
-        else:
-            include_file = loader.path_dwim_relative(
-                loader.get_basedir(), cumulative_path, include_target
-            )
+        include_file, include_file_exists = _resolve_include_file(
+            loader, role_path, cumulative_path, include_target
+        )
 
-        if os.path.exists(include_file):
+        if include_file_exists:
             break
         else:
             parent_include = parent_include._parent
 
     if include_file is None:
-        if original_task._role:
-            include_target = templar.template(include_param)
-            include_file = loader.path_dwim_relative(
-                original_task._role._role_path, "tasks", include_target
-            )
+        if role_path is not None:
+            include_file = loader.path_dwim_relative(role_path, "tasks", include_target)
         else:
-            include_file = loader.path_dwim(templar.template(include_param))
+            include_file = loader.path_dwim(include_target)
 
     return include_file
+
+
+def _resolve_include_file(
+    loader: DataLoader,
+    role_path: Optional[str],
+    cumulative_path: str,
+    include_target: str,
+) -> Tuple[str, bool]:
+    """
+    Find the file to include relatively to the path of a parent include, and check if it exists.
+    The results are cached: the tasks of a same included file share the same parents, so the same paths are resolved
+    again and again. See :func:`clear_include_cache`
+    :param loader:
+    :param role_path: The path of the role of the include task, if any
+    :param cumulative_path: The path of the parent include, relative to the basedir or to the tasks of the role
+    :param include_target: The templated file to include
+    :return: The path of the file to include and whether it exists
+    """
+    key = (loader.get_basedir(), role_path, cumulative_path, to_text(include_target))
+    cached = _INCLUDE_RESOLVE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    if role_path is not None:
+        new_basedir = os.path.join(role_path, "tasks", cumulative_path)
+        candidates = [
+            loader.path_dwim_relative(role_path, "tasks", include_target),
+            loader.path_dwim_relative(new_basedir, "tasks", include_target),
+        ]
+        for include_file in candidates:
+            try:
+                # may throw OSError
+                os.stat(include_file)
+                # or select the task file if it exists
+                break
+            except OSError:
+                pass
+    else:
+        include_file = loader.path_dwim_relative(
+            loader.get_basedir(), cumulative_path, include_target
+        )
+
+    result = include_file, os.path.exists(include_file)
+    _INCLUDE_RESOLVE_CACHE[key] = result
+    return result
+
+
+def clear_include_cache():
+    """
+    Clear the cache of the resolved include paths. It should be called once a playbook has been parsed: the files may
+    change between two runs.
+    :return:
+    """
+    _INCLUDE_RESOLVE_CACHE.clear()
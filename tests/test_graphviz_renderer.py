@@ -27,17 +27,15 @@ def run_grapher(
     :return: SVG path and playbooks absolute paths
     """
     additional_args = additional_args or []
-    # Explicitly add verbosity to the tests
-    additional_args.insert(0, "-vv")
+    playbook_paths = [os.path.join(FIXTURES_DIR, p_file) for p_file in playbook_files]
 
-    if os.environ.get("TEST_VIEW_GENERATED_FILE") == "1":
-        additional_args.insert(0, "--view")
+    # Clean the name a little bit
+    output_filename = output_filename.replace("[", "-").replace("]", "")
+    # put the generated file in a dedicated folder
+    args = [__prog__, "-o", os.path.join(DIR_PATH, "generated-svgs", output_filename)]
 
     if os.environ.get("GITHUB_ACTIONS") == "true":
         # Setting a custom protocol handler for browsing on github
-        additional_args.insert(0, "--open-protocol-handler")
-        additional_args.insert(1, "custom")
-
         repo = os.environ["GITHUB_REPOSITORY"]
         commit_sha = os.environ["COMMIT_SHA"]
         formats = {
@@ -45,24 +43,23 @@ def run_grapher(
             "folder": f"https://github.com/{repo}/tree/{commit_sha}" + "/{path}",
             "remove_from_path": os.environ["GITHUB_WORKSPACE"],
         }
+        args.extend(
+            [
+                "--open-protocol-handler",
+                "custom",
+                "--open-protocol-custom-formats",
+                json.dumps(formats),
+            ]
+        )
+    elif "--open-protocol-handler" not in additional_args:
+        args.extend(["--open-protocol-handler", "vscode"])
 
-        additional_args.insert(2, "--open-protocol-custom-formats")
-        additional_args.insert(3, json.dumps(formats))
-
-    if "--open-protocol-handler" not in additional_args:
-        additional_args.insert(0, "--open-protocol-handler")
-        additional_args.insert(1, "vscode")
-
-    playbook_paths = [os.path.join(FIXTURES_DIR, p_file) for p_file in playbook_files]
-    args = [__prog__]
-
-    # Clean the name a little bit
-    output_filename = output_filename.replace("[", "-").replace("]", "")
-    # put the generated file in a dedicated folder
-    args.extend(["-o", os.path.join(DIR_PATH, "generated-svgs", output_filename)])
+    if os.environ.get("TEST_VIEW_GENERATED_FILE") == "1":
+        args.append("--view")
 
+    # Explicitly add verbosity to the tests
+    args.append("-vv")
     args.extend(additional_args)
-
     args.extend(playbook_paths)
 
     cli = PlaybookGrapherCLI(args)
@@ -23,27 +23,26 @@ def run_grapher(
     :param playbook_files:
     :return: Mermaid file path and playbooks absolute paths
     """
-    additional_args = additional_args or []
-    # Explicitly add verbosity to the tests
-    additional_args.insert(0, "-vvv")
-
-    if os.environ.get("TEST_VIEW_GENERATED_FILE") == "1":
-        additional_args.insert(0, "--view")
-
     playbook_paths = [os.path.join(FIXTURES_DIR, p_file) for p_file in playbook_files]
-    args = [__prog__]
 
     # Clean the name a little bit
     output_filename = (
         output_filename.replace("[", "-").replace("]", "").replace(".yml", "")
     )
     # put the generated file in a dedicated folder
-    args.extend(["-o", os.path.join(DIR_PATH, "generated-mermaids", output_filename)])
+    args = [
+        __prog__,
+        "-o",
+        os.path.join(DIR_PATH, "generated-mermaids", output_filename),
+    ]
 
-    args.extend(additional_args)
+    if os.environ.get("TEST_VIEW_GENERATED_FILE") == "1":
+        args.append("--view")
 
+    # Explicitly add verbosity to the tests
+    args.append("-vvv")
+    args.extend(additional_args or [])
     args.extend(["--renderer", "mermaid-flowchart"])
-
     args.extend(playbook_paths)
 
     cli = PlaybookGrapherCLI(args)
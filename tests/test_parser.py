@@ -2,6 +2,7 @@ import os
 from typing import List
 
 import pytest
+from ansible.playbook.task import Task
 from ansible.utils.display import Display
 
 from ansibleplaybookgrapher.parser import PlaybookParser
@@ -375,3 +376,100 @@ def test_roles_dependencies(grapher_cli: PlaybookGrapherCLI):
         assert (
             dependant_role_name in task_from_dependency.name
         ), f"The task name should include the dependant role name '{dependant_role_name}'"
+
+
+@pytest.mark.parametrize("grapher_cli", [["tags.yml"]], indirect=True)
+@pytest.mark.parametrize(
+    ["tags", "skip_tags"],
+    [
+        (None, None),
+        (["tag1"], None),
+        (["untagged"], None),
+        (["tagged"], None),
+        (None, ["untagged"]),
+        (None, ["all"]),
+        (["all"], ["tag1"]),
+    ],
+)
+def test_untagged_included(grapher_cli: PlaybookGrapherCLI, tags, skip_tags):
+    """
+    Test that the precomputed result for the untagged objects matches the one from Ansible
+    :return:
+    """
+    parser = PlaybookParser(
+        grapher_cli.options.playbook_filenames[0], tags=tags, skip_tags=skip_tags
+    )
+    assert parser._untagged_included == Task().evaluate_tags(
+        only_tags=parser.tags, skip_tags=parser.skip_tags, all_vars={}
+    )
+
+
+@pytest.mark.parametrize("grapher_cli", [["include_tasks_twice.yml"]], indirect=True)
+def test_include_tasks_twice_parsing(grapher_cli: PlaybookGrapherCLI):
+    """
+    Test parsing the same file included twice in a play: each include should have its own tasks
+    :return:
+    """
+    parser = PlaybookParser(grapher_cli.options.playbook_filenames[0])
+    playbook_node = parser.parse()
+    tasks = playbook_node.plays()[0].tasks
+    assert len(tasks) == 22
+
+    for first_task, second_task in zip(tasks[:3], tasks[3:6]):
+        assert first_task.name == second_task.name
+        assert first_task.line == second_task.line
+        assert first_task.raw_object is not second_task.raw_object
+
+    assert tasks[0].raw_object._parent._parent.get_name() == "Include some tasks"
+    assert (
+        tasks[3].raw_object._parent._parent.get_name() == "Include the same tasks again"
+    )
+
+    # The blocks of the static imports inside the included file stay implicit for both includes
+    for first_task, second_task in zip(tasks[12:17], tasks[17:22]):
+        assert first_task.name == second_task.name
+        assert first_task.raw_object is not second_task.raw_object
+        assert type(first_task) is type(second_task)
+
+    block_nodes = [task for task in tasks[12:] if isinstance(task, BlockNode)]
+    assert len(block_nodes) == 2
+    for block_node in block_nodes:
+        assert block_node.name == "Block with an import"
+        assert [task.name for task in block_node.tasks] == [
+            "Included task one",
+            "Included task two",
+            "Included task three",
+        ]
+
+
+@pytest.mark.parametrize(
+    "grapher_cli", [["include_tasks_in_blocks.yml"]], indirect=True
+)
+def test_include_tasks_in_blocks_parsing(grapher_cli: PlaybookGrapherCLI):
+    """
+    Test that the tasks included inside nested blocks are added to their block
+    :param grapher_cli:
+    :return:
+    """
+    parser = PlaybookParser(grapher_cli.options.playbook_filenames[0])
+    playbook_node = parser.parse()
+    tasks = playbook_node.plays()[0].tasks
+    assert len(tasks) == 2
+
+    outer_block = tasks[0]
+    assert isinstance(outer_block, BlockNode)
+    assert outer_block.name == "Outer block"
+    assert tasks[1].name == "Task after the outer block"
+
+    outer_block_tasks = outer_block.tasks
+    assert len(outer_block_tasks) == 2
+    inner_block = outer_block_tasks[0]
+    assert isinstance(inner_block, BlockNode)
+    assert inner_block.name == "Inner block"
+    assert outer_block_tasks[1].name == "Task after the inner block"
+
+    assert [task.name for task in inner_block.tasks] == [
+        "Included task one",
+        "Included task two",
+        "Included task three",
+    ]
@@ -1,4 +1,13 @@
-from ansibleplaybookgrapher.utils import merge_dicts
+import re
+import pytest
+
+from ansibleplaybookgrapher.utils import (
+    merge_dicts,
+    is_possibly_template,
+    hash_value,
+    get_play_colors,
+    convert_when_to_str,
+)
 
 
 def test_merge_dicts():
@@ -9,3 +18,63 @@ def test_merge_dicts():
 
     res = merge_dicts({"1": {2, 3}, "4": {5}, "9": [11]}, {"4": {7}, "9": set()})
     assert res == {"1": {2, 3}, "4": {5, 7}, "9": {11}}
+
+
+@pytest.mark.parametrize(
+    ["data", "expected"],
+    [
+        ("Debug", False),
+        ("Debug {{ msg }}", True),
+        ("{% if x %}Debug{% endif %}", True),
+        ("Debug {# comment #}", True),
+        ("#jinja2:variable_start_string:'[%'\nDebug [% msg %]", True),
+        ("Debug { msg }", False),
+    ],
+)
+def test_is_possibly_template(data: str, expected: bool):
+    """
+    Test the detection of the Jinja templates
+    :return:
+    """
+    assert is_possibly_template(data) == expected
+
+
+def test_hash_value():
+    """
+    Test the hash used as id: it should be stable and short
+    :return:
+    """
+    assert hash_value("fake_role") == hash_value("fake_role")
+    assert hash_value("fake_role") != hash_value("display_some_facts")
+    assert len(hash_value("fake_role")) == 8
+
+
+def test_get_play_colors():
+    """
+    Test the colors of the plays: the same play id should always get the same color
+    :return:
+    """
+    main_color, font_color = get_play_colors("play_1")
+    assert get_play_colors("play_1") == (main_color, font_color)
+    assert get_play_colors("play_2")[0] != main_color
+    assert font_color == "#ffffff"
+    assert re.fullmatch(r"#[0-9a-f]{6}", main_color)
+
+
+@pytest.mark.parametrize(
+    "when, expected",
+    [
+        ([], ""),
+        (["ansible_os_family == 'Debian'"], "[when: ansible_os_family == 'Debian']"),
+        ([True], "[when: True]"),
+        (["a is defined", "b\n | bool"], "[when: a is defined and b | bool]"),
+    ],
+)
+def test_convert_when_to_str(when, expected):
+    """
+    Test the conversion of the when conditions to str
+    :param when:
+    :param expected:
+    :return:
+    """
+    assert convert_when_to_str(when) == expected